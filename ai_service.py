@@ -1,49 +1,126 @@
 import os
+import atexit
+import random
 import logging
 import json
 import re
-from typing import Dict, Any, Optional
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Iterator, Optional, Tuple
 from google import genai
 from google.genai import types
 
+# Static instructions sent ahead of the per-request details, so repeated prompts share a prefix
+PROMPT_PREFIX_PARTS = {
+    'reverse_lookup': types.Part(text="Please provide a natural, conversational response using only the fact from the database below.\n\n"),
+    'default': types.Part(text="Please rephrase the database answer below into a complete, natural, conversational response for the student. Include ALL details mentioned in the database answer.\n\n"),
+    'follow_up': types.Part(text="Please provide a complete, expanded answer that addresses what the student might be looking for in their follow-up below.\n\n"),
+}
+
+# Random source for picking response templates
+_RNG = random.Random()
+
+# System prompts for the Gemini calls, keyed by prompt kind
+SYSTEM_PROMPTS = {
+    'reverse_lookup': """You are a helpful assistant for APS Mangla school. 
+A student asked about a person or entity, and we found information about them in our database.
+Provide a natural, conversational response using ONLY the provided fact.
+Make it sound friendly and informative, as if you're a knowledgeable school representative.""",
+    'default': """You are a helpful assistant for APS Mangla school.
+A student asked a question and we found a relevant answer in our database.
+Convert the factual answer into a natural, conversational response.
+Keep it friendly, informative, and student-appropriate.
+IMPORTANT: Provide a COMPLETE answer with all relevant details from the database.
+If the answer mentions subjects, list ALL of them. If it mentions requirements, include ALL requirements.
+Use ONLY the provided information - don't add external facts.""",
+    'follow_up': """You are an APS Mangla school assistant. A student asked a follow-up question like 'and?' or 'what else?' 
+about a previous topic. Based on the original question and previous answer, provide a complete, 
+comprehensive response that includes all relevant information.
+
+If the previous answer was incomplete, expand it with related details.
+If you can't provide more information, acknowledge that and suggest other school topics they might ask about.""",
+}
+
+# Markdown emphasis markers stripped from Gemini output
+_STAR_RE = re.compile(r'\*+')
+
+# Common follow-up patterns
+_FOLLOW_UP_PATTERNS = frozenset([
+    'and?', 'and what else?', 'what else?', 'more', 'tell me more',
+    'anything else?', 'what about the rest?', 'continue', 'go on',
+    'what more?', 'others?', 'rest?', 'more info', 'more information'
+])
+
+# Small talk template selection in one pass
+_SMALL_TALK_RE = re.compile(r'(?P<how>how are you|how is it going)|(?P<what>what can you do|what do you know)')
+
+ENHANCE_CACHE_FILE = os.path.join('data', 'enhance_cache.json')
+ENHANCE_CACHE_SIZE = 1000
+
 class AIService:
-    def __init__(self):
+    def __init__(self, enhance_cache_file: str = ENHANCE_CACHE_FILE):
         self.api_key = os.getenv("GEMINI_API_KEY", "default_key")
         self.client = genai.Client(api_key=self.api_key)
         self.model_name = "gemini-2.5-flash"
         
+        # AI-enhanced responses keyed by (search_type, database answer)
+        self.enhance_cache_file = enhance_cache_file
+        self._enhance_cache: OrderedDict[Tuple[str, str], str] = OrderedDict()
+        self._enhance_cache_lock = threading.Lock()
+        self._load_enhance_cache()
+        atexit.register(self._save_enhance_cache)
+        
+        # Rephrase every high confidence answer with AI, even ones that are already well-formed
+        self.always_ai_rephrase = os.getenv("ALWAYS_AI_REPHRASE", "false").lower() == "true"
+        
+        # Generation configs don't change between calls, so build them once
+        self._generation_configs = {
+            kind: self._build_generation_config(kind) for kind in SYSTEM_PROMPTS
+        }
+        self._legacy_generation_config = types.GenerateContentConfig(
+            temperature=0.8,
+            max_output_tokens=150
+        )
+        
         # Response templates for different scenarios
         self.templates = {
-            'greeting': [
+            'greeting': (
                 "Hello! 👋 I'm your APS Mangla assistant. How can I help you with information about the school today?",
                 "Hi there! 🏫 I'm here to help you with questions about APS Mangla. What would you like to know?",
                 "Assalamualaikum! Welcome to APS Mangla's virtual assistant. I'm ready to help with your questions!",
-            ],
-            'farewell': [
+            ),
+            'farewell': (
                 "Goodbye! Feel free to come back anytime if you have more questions about APS Mangla. 👋",
                 "Thank you for using APS Mangla's assistant! Have a great day! 🌟",
                 "Khuda hafiz! I'm always here if you need more help with school information. 📚",
-            ],
+            ),
             'small_talk': {
                 'how_are_you': "I'm doing great, thank you for asking! I'm here and ready to help you with information about APS Mangla. What would you like to know? 😊",
                 'what_can_you_do': "I can help you with information about APS Mangla! I know about our principal, subjects like ICS, school policies, schedules, and much more. Just ask me anything about the school! 🎓",
                 'capabilities': "I'm specialized in providing information about APS Mangla. I can answer questions about staff, curriculum, facilities, admission procedures, and general school information. How can I assist you today? 📖"
             },
-            'low_confidence': [
+            'low_confidence': (
                 "I'm not completely sure about that. Could you try asking your question in a different way? I'm specifically designed to help with APS Mangla information.",
                 "That's a bit outside my current knowledge about APS Mangla. Could you rephrase your question or ask about something else related to the school?",
                 "I'd like to help, but I'm not confident about that particular information. Is there something else about APS Mangla I can assist with?"
-            ],
-            'no_match': [
+            ),
+            'no_match_question': (
+                "I don't have specific information about that question yet. I focus on APS Mangla school details like our principal, subjects, facilities, and policies. Is there something else about the school I can help with?",
+                "That's not in my current knowledge base about APS Mangla. I can help with information about teachers, curriculum, school facilities, and general school information. What else would you like to know?",
+                "I'm still building my knowledge about APS Mangla! I don't have details about that particular topic, but I can assist with questions about staff, subjects like ICS, school procedures, and more. How else can I help?"
+            ),
+            'no_match': (
                 "I don't have information about that specific topic yet. I'm focused on APS Mangla school information. You could ask about our principal, subjects, facilities, or other school-related matters.",
                 "That's not something I know about yet. I specialize in APS Mangla information - try asking about teachers, classes, schedules, or school policies!",
                 "I'm still learning! I don't have details about that, but I can help with APS Mangla school information. What else would you like to know about the school?"
-            ]
+            )
         }
     
-    def get_intelligent_response(self, user_input: str, data_manager, conversation_memory: Optional[list] = None) -> Dict[str, Any]:
+    def get_intelligent_response(self, user_input: str, data_manager, conversation_memory: Optional[list] = None, stream: bool = False) -> Dict[str, Any]:
         """
         Generate intelligent responses using enhanced logic and AI rephrasing
+        With stream=True, AI-enhanced answers are returned with a 'response_stream' iterator
+        Search-backed answers that are the same on every call are marked 'cacheable'
         """
         try:
             # Initialize conversation memory if not provided
@@ -54,9 +131,8 @@ class AIService:
             if self._is_follow_up_question(user_input) and conversation_memory:
                 return self._handle_follow_up_question(user_input, conversation_memory, data_manager)
             
-            # Get contextual search results
-            search_results = data_manager.get_contextual_search_results(user_input)
-            query_analysis = search_results['query_analysis']
+            # Classify the query before running the knowledge base search
+            query_analysis = data_manager.classify_query(user_input)
             
             # Handle greetings first
             if query_analysis['is_greeting']:
@@ -70,15 +146,22 @@ class AIService:
             if query_analysis['is_small_talk']:
                 return self._handle_small_talk(user_input)
             
+            # Get contextual search results only for actual queries
+            search_results = data_manager.get_contextual_search_results(user_input, query_analysis)
+            
             # Handle Q&A with different confidence levels
             answer = search_results['answer']
             confidence = search_results['confidence']
             search_type = search_results['search_type']
             
             if answer and confidence >= 0.4:
+                # Well-formed answers can be presented without an AI round-trip
+                if not self.always_ai_rephrase and self._is_presentation_ready(answer):
+                    return self._handle_presentation_ready(answer, confidence)
+                
                 # High confidence - enhance with AI and provide complete information
                 return self._enhance_response_with_ai(
-                    user_input, answer, confidence, search_type, complete_answer=True
+                    user_input, answer, confidence, search_type, complete_answer=True, stream=stream
                 )
             elif answer and confidence >= 0.2:
                 # Medium confidence - use template enhancement
@@ -96,10 +179,64 @@ class AIService:
                 'confidence': '0.00'
             }
     
+    def _build_generation_config(self, kind: str) -> types.GenerateContentConfig:
+        """Build the generation config for a system prompt kind"""
+        return types.GenerateContentConfig(
+            system_instruction=SYSTEM_PROMPTS[kind],
+            temperature=0.7,
+            max_output_tokens=300
+        )
+    
+    def _load_enhance_cache(self):
+        """Load persisted AI-enhanced responses from file"""
+        if not os.path.exists(self.enhance_cache_file):
+            return
+        try:
+            with open(self.enhance_cache_file, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+            for search_type, answer, enhanced_response in entries[-ENHANCE_CACHE_SIZE:]:
+                self._enhance_cache[(search_type, answer)] = enhanced_response
+            logging.debug(f"Loaded {len(self._enhance_cache)} cached AI responses")
+        except Exception as e:
+            logging.error(f"Error loading enhance cache: {str(e)}")
+    
+    def _save_enhance_cache(self):
+        """Persist AI-enhanced responses so they survive restarts"""
+        with self._enhance_cache_lock:
+            entries = [[search_type, answer, enhanced_response]
+                       for (search_type, answer), enhanced_response in self._enhance_cache.items()]
+        if not entries:
+            return
+        # Every worker saves at shutdown, so write a per-process temp file and swap it in
+        tmp_file = f"{self.enhance_cache_file}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(entries, f, ensure_ascii=False)
+            os.replace(tmp_file, self.enhance_cache_file)
+        except Exception as e:
+            logging.error(f"Error saving enhance cache: {str(e)}")
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+    
+    def _get_enhanced_from_cache(self, key: Tuple[str, str]) -> Optional[str]:
+        """Return a previously enhanced response for the same database answer"""
+        with self._enhance_cache_lock:
+            enhanced_response = self._enhance_cache.get(key)
+            if enhanced_response is not None:
+                self._enhance_cache.move_to_end(key)
+            return enhanced_response
+    
+    def _store_enhanced_in_cache(self, key: Tuple[str, str], enhanced_response: str):
+        """Remember an enhanced response, evicting the least recently used entry"""
+        with self._enhance_cache_lock:
+            self._enhance_cache[key] = enhanced_response
+            self._enhance_cache.move_to_end(key)
+            if len(self._enhance_cache) > ENHANCE_CACHE_SIZE:
+                self._enhance_cache.popitem(last=False)
+    
     def _handle_greeting(self, user_input: str) -> Dict[str, Any]:
         """Handle greeting messages"""
-        import random
-        response = random.choice(self.templates['greeting'])
+        response = _RNG.choice(self.templates['greeting'])
         return {
             'response': response,
             'confidence': '1.00'
@@ -107,8 +244,7 @@ class AIService:
     
     def _handle_farewell(self, user_input: str) -> Dict[str, Any]:
         """Handle farewell messages"""
-        import random
-        response = random.choice(self.templates['farewell'])
+        response = _RNG.choice(self.templates['farewell'])
         return {
             'response': response,
             'confidence': '1.00'
@@ -116,11 +252,11 @@ class AIService:
     
     def _handle_small_talk(self, user_input: str) -> Dict[str, Any]:
         """Handle small talk"""
-        user_lower = user_input.lower()
+        match = _SMALL_TALK_RE.search(user_input.lower())
         
-        if 'how are you' in user_lower or 'how is it going' in user_lower:
+        if match and match.group('how'):
             response = self.templates['small_talk']['how_are_you']
-        elif 'what can you do' in user_lower or 'what do you know' in user_lower:
+        elif match and match.group('what'):
             response = self.templates['small_talk']['what_can_you_do']
         else:
             response = self.templates['small_talk']['capabilities']
@@ -130,55 +266,64 @@ class AIService:
             'confidence': '1.00'
         }
     
-    def _enhance_response_with_ai(self, user_input: str, answer: str, confidence: float, search_type: str, complete_answer: bool = False) -> Dict[str, Any]:
-        """Use AI to enhance responses for high confidence matches"""
+    def _enhance_response_with_ai(self, user_input: str, answer: str, confidence: float, search_type: str, complete_answer: bool = False, stream: bool = False) -> Dict[str, Any]:
+        """
+        Use AI to enhance responses for high confidence matches
+        With stream=True the result carries a 'response_stream' iterator of text chunks
+        """
+        # Identical database answers get identical enhanced text
+        cache_key = (search_type, answer)
+        cached_response = self._get_enhanced_from_cache(cache_key)
+        if cached_response is not None:
+            return {
+                'response': cached_response,
+                'confidence': f"{confidence:.2f}",
+                'cacheable': True
+            }
+        
         try:
             # Create enhanced prompt based on search type
+            prompt_kind = 'reverse_lookup' if search_type == 'reverse_lookup' else 'default'
             if search_type == 'reverse_lookup':
-                system_prompt = """You are a helpful assistant for APS Mangla school. 
-A student asked about a person or entity, and we found information about them in our database.
-Provide a natural, conversational response using ONLY the provided fact.
-Make it sound friendly and informative, as if you're a knowledgeable school representative."""
-                
                 user_prompt = f"""Student asked: "{user_input}"
 Fact from database: "{answer}"
-
-Please provide a natural, conversational response using only this information."""
+"""
             else:
-                system_prompt = """You are a helpful assistant for APS Mangla school.
-A student asked a question and we found a relevant answer in our database.
-Convert the factual answer into a natural, conversational response.
-Keep it friendly, informative, and student-appropriate.
-IMPORTANT: Provide a COMPLETE answer with all relevant details from the database.
-If the answer mentions subjects, list ALL of them. If it mentions requirements, include ALL requirements.
-Use ONLY the provided information - don't add external facts."""
-                
                 user_prompt = f"""Student question: "{user_input}"
 Database answer: "{answer}"
-
-Please rephrase this into a complete, natural, conversational response for the student. Include ALL details mentioned in the database answer."""
+"""
+            
+            contents = [
+                types.Content(role="user", parts=[PROMPT_PREFIX_PARTS[prompt_kind], types.Part(text=user_prompt)])
+            ]
+            
+            if stream:
+                # The database answer stands in for the streamed text in conversation memory
+                fallback_response = self._handle_medium_confidence(user_input, answer, confidence, search_type)['response']
+                return {
+                    'response': answer,
+                    'confidence': f"{confidence:.2f}",
+                    'response_stream': self._stream_enhanced_response(
+                        contents, prompt_kind, cache_key, fallback_response
+                    )
+                }
             
             response = self.client.models.generate_content(
                 model=self.model_name,
-                contents=[
-                    types.Content(role="user", parts=[types.Part(text=user_prompt)])
-                ],
-                config=types.GenerateContentConfig(
-                    system_instruction=system_prompt,
-                    temperature=0.7,
-                    max_output_tokens=300
-                )
+                contents=contents,
+                config=self._generation_configs[prompt_kind]
             )
             
             if response.text:
                 enhanced_response = response.text.strip()
                 # Clean up any unwanted formatting
-                enhanced_response = re.sub(r'\*\*', '', enhanced_response)
-                enhanced_response = re.sub(r'\*', '', enhanced_response)
+                enhanced_response = _STAR_RE.sub('', enhanced_response)
+                self._store_enhanced_in_cache(cache_key, enhanced_response)
                 
                 return {
                     'response': enhanced_response,
-                    'confidence': f"{confidence:.2f}"
+                    'confidence': f"{confidence:.2f}",
+                    'cacheable': True
                 }
         
         except Exception as e:
@@ -187,6 +332,48 @@ Please rephrase this into a complete, natural, conversational response for the s
         # Fallback to template-based response
         return self._handle_medium_confidence(user_input, answer, confidence, search_type)
     
+    def _stream_enhanced_response(self, contents: list, prompt_kind: str, cache_key: Tuple[str, str], fallback_response: str) -> Iterator[str]:
+        """Yield cleaned chunks of an AI-enhanced response as Gemini generates them"""
+        chunks = []
+        try:
+            for chunk in self.client.models.generate_content_stream(
+                model=self.model_name,
+                contents=contents,
+                config=self._generation_configs[prompt_kind]
+            ):
+                # Clean up formatting on each chunk as it arrives
+                text = _STAR_RE.sub('', chunk.text or '')
+                if not chunks:
+                    text = text.lstrip()
+                if text:
+                    chunks.append(text)
+                    yield text
+        except Exception as e:
+            logging.error(f"Error streaming response with AI: {str(e)}")
+            if not chunks:
+                yield fallback_response
+            return
+        
+        enhanced_response = ''.join(chunks).rstrip()
+        if enhanced_response:
+            self._store_enhanced_in_cache(cache_key, enhanced_response)
+        else:
+            yield fallback_response
+    
+    @staticmethod
+    def _is_presentation_ready(answer: str) -> bool:
+        """Check if a database answer is already a complete sentence that needs no rephrasing"""
+        answer = answer.rstrip()
+        return len(answer) >= 20 and answer[-1] in '.!?' and '{' not in answer
+    
+    def _handle_presentation_ready(self, answer: str, confidence: float) -> Dict[str, Any]:
+        """Return a well-formed database answer as stored"""
+        return {
+            'response': answer.strip(),
+            'confidence': f"{confidence:.2f}",
+            'cacheable': True
+        }
+    
     def _handle_medium_confidence(self, user_input: str, answer: str, confidence: float, search_type: str) -> Dict[str, Any]:
         """Handle medium confidence responses with templates"""
         if search_type == 'reverse_lookup':
@@ -201,21 +388,15 @@ Please rephrase this into a complete, natural, conversational response for the s
     
     def _handle_no_match(self, user_input: str, query_analysis: Dict[str, Any]) -> Dict[str, Any]:
         """Handle cases where no good match is found"""
-        import random
-        
         # Choose appropriate fallback based on query type
         if query_analysis['is_question']:
             # It's a question, but we don't have the answer
-            fallback_responses = [
-                "I don't have specific information about that question yet. I focus on APS Mangla school details like our principal, subjects, facilities, and policies. Is there something else about the school I can help with?",
-                "That's not in my current knowledge base about APS Mangla. I can help with information about teachers, curriculum, school facilities, and general school information. What else would you like to know?",
-                "I'm still building my knowledge about APS Mangla! I don't have details about that particular topic, but I can assist with questions about staff, subjects like ICS, school procedures, and more. How else can I help?"
-            ]
+            fallback_responses = self.templates['no_match_question']
         else:
             # General no match
             fallback_responses = self.templates['no_match']
         
-        response = random.choice(fallback_responses)
+        response = _RNG.choice(fallback_responses)
         
         return {
             'response': response,
@@ -239,10 +420,7 @@ Make it friendly and natural, but use only the provided information."""
             response = self.client.models.generate_content(
                 model=self.model_name,
                 contents=prompt,
-                config=types.GenerateContentConfig(
-                    temperature=0.8,
-                    max_output_tokens=150
-                )
+                config=self._legacy_generation_config
             )
             
             if response.text:
@@ -257,15 +435,7 @@ Make it friendly and natural, but use only the provided information."""
     def _is_follow_up_question(self, user_input: str) -> bool:
         """Check if the user input is a follow-up question"""
         user_lower = user_input.lower().strip()
-        
-        # Common follow-up patterns
-        follow_up_patterns = [
-            'and?', 'and what else?', 'what else?', 'more', 'tell me more', 
-            'anything else?', 'what about the rest?', 'continue', 'go on',
-            'what more?', 'others?', 'rest?', 'more info', 'more information'
-        ]
-        
-        return user_lower in follow_up_patterns or user_lower.endswith('?') and len(user_lower.split()) <= 3
+        return user_lower in _FOLLOW_UP_PATTERNS or user_lower.endswith('?') and len(user_lower.split()) <= 3
     
     def _handle_follow_up_question(self, user_input: str, conversation_memory: list, data_manager) -> Dict[str, Any]:
         """Handle follow-up questions based on conversation context"""
@@ -307,36 +477,26 @@ Make it friendly and natural, but use only the provided information."""
             search_results = data_manager.get_contextual_search_results(last_question)
             
             # Use AI to provide a more complete answer
-            system_prompt = """You are an APS Mangla school assistant. A student asked a follow-up question like 'and?' or 'what else?' 
-about a previous topic. Based on the original question and previous answer, provide a complete, 
-comprehensive response that includes all relevant information.
-
-If the previous answer was incomplete, expand it with related details.
-If you can't provide more information, acknowledge that and suggest other school topics they might ask about."""
-            
             user_prompt = f"""Original question: "{last_question}"
 Previous answer: "{last_answer}"
 Follow-up: "{user_input}"
-
-Please provide a complete, expanded answer that addresses what they might be looking for."""
+"""
+            # Ground the expansion in the stored answer for the previous topic
+            if search_results['answer']:
+                user_prompt += f'Database information: "{search_results["answer"]}"\n'
             
             response = self.client.models.generate_content(
                 model=self.model_name,
                 contents=[
-                    types.Content(role="user", parts=[types.Part(text=user_prompt)])
+                    types.Content(role="user", parts=[PROMPT_PREFIX_PARTS['follow_up'], types.Part(text=user_prompt)])
                 ],
-                config=types.GenerateContentConfig(
-                    system_instruction=system_prompt,
-                    temperature=0.7,
-                    max_output_tokens=300
-                )
+                config=self._generation_configs['follow_up']
             )
             
             if response.text:
                 enhanced_response = response.text.strip()
                 # Clean up formatting
-                enhanced_response = re.sub(r'\*\*', '', enhanced_response)
-                enhanced_response = re.sub(r'\*', '', enhanced_response)
+                enhanced_response = _STAR_RE.sub('', enhanced_response)
                 
                 return {
                     'response': enhanced_response,
@@ -1,20 +1,14 @@
 import os
+import re
+import json
 import logging
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash
+import threading
+from collections import OrderedDict, deque
+from flask import Flask, Response, render_template, request, jsonify, session, redirect, url_for, flash, stream_with_context
 from werkzeug.security import generate_password_hash, check_password_hash
 from data_manager import DataManager
 from ai_service import AIService
 
-app = Flask(__name__)
-
-@app.route("/")
-def home():
-    return "Hello Railway!"  # You can change this
-
-if __name__ == "__main__":
-    port = int(os.environ.get("PORT", 5000))  # Railway assigns port via $PORT
-    app.run(host="0.0.0.0", port=port)
-    
 # Configure logging for debugging
 logging.basicConfig(level=logging.DEBUG)
 
@@ -22,9 +16,61 @@ logging.basicConfig(level=logging.DEBUG)
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "dev-key-change-in-production")
 
-# Initialize services
+# Send emoji and Urdu text as UTF-8 instead of \uXXXX escapes to keep responses small
+app.json.ensure_ascii = False
+
+# Initialize services. The knowledge base is loaded at import so gunicorn --preload
+# shares it with every worker; AIService holds a genai client whose connection pool
+# can't be shared safely across a fork, so each worker process creates its own on first use.
 data_manager = DataManager()
-ai_service = AIService()
+_ai_service = None
+_ai_service_lock = threading.Lock()
+
+def get_ai_service():
+    """Return this process's AIService, creating it on first use"""
+    global _ai_service
+    if _ai_service is None:
+        with _ai_service_lock:
+            if _ai_service is None:
+                _ai_service = AIService()
+    return _ai_service
+
+# Number of exchanges kept in conversation memory
+MEMORY_SIZE = 5
+
+# Maximum characters of each bot reply kept in conversation memory
+MEMORY_RESPONSE_CHARS = 500
+
+# Exact-match cache of chat responses keyed by normalized message
+RESPONSE_CACHE_SIZE = 512
+_response_cache = OrderedDict()
+_response_cache_lock = threading.Lock()
+
+def _normalize_message(message):
+    """Normalize a chat message for use as a response cache key"""
+    return re.sub(r'\s+', ' ', message.strip().lower())
+
+def _get_cached_response(norm_msg):
+    """Return a cached response for the message, or None on a miss"""
+    with _response_cache_lock:
+        cached = _response_cache.get(norm_msg)
+        if cached is not None:
+            _response_cache.move_to_end(norm_msg)
+            return dict(cached)
+    return None
+
+def _cache_response(norm_msg, response_data):
+    """Store a response, evicting the least recently used entry when full"""
+    with _response_cache_lock:
+        _response_cache[norm_msg] = dict(response_data)
+        _response_cache.move_to_end(norm_msg)
+        if len(_response_cache) > RESPONSE_CACHE_SIZE:
+            _response_cache.popitem(last=False)
+
+def _clear_response_cache():
+    """Drop all cached responses so knowledge base edits take effect immediately"""
+    with _response_cache_lock:
+        _response_cache.clear()
 
 @app.route('/')
 def index():
@@ -41,34 +87,53 @@ def chat():
         
         logging.debug(f"Received message: {message}")
         
-        # Initialize conversation memory if not exists
-        if 'conversation_memory' not in session:
-            session['conversation_memory'] = []
+        conversation_memory = session.get('conversation_memory', [])
+        ai_service = get_ai_service()
+        
+        # Clients that accept server-sent events get AI-enhanced answers streamed
+        wants_stream = 'text/event-stream' in request.headers.get('Accept', '')
+        
+        # Follow-up questions depend on conversation context and can't be cached
+        is_follow_up = bool(conversation_memory) and ai_service._is_follow_up_question(message)
+        norm_msg = _normalize_message(message)
         
-        # Get intelligent response using enhanced AI service with conversation context
-        response_data = ai_service.get_intelligent_response(
-            message, data_manager, session.get('conversation_memory', [])
-        )
+        response_stream = None
+        response_data = None if is_follow_up else _get_cached_response(norm_msg)
+        if response_data is None:
+            # Get intelligent response using enhanced AI service with conversation context
+            response_data = ai_service.get_intelligent_response(
+                message, data_manager, conversation_memory, stream=wants_stream
+            )
+            response_stream = response_data.pop('response_stream', None)
+            cacheable = response_data.pop('cacheable', False)
+            
+            # Only cache complete answers backed by the knowledge base; templated replies such
+            # as greetings vary between calls, and low-quality fallbacks shouldn't stick
+            if cacheable and not is_follow_up and response_stream is None:
+                _cache_response(norm_msg, response_data)
+        else:
+            logging.debug(f"Response cache hit for: {norm_msg}")
         
-        # Update conversation memory
+        # Update conversation memory, truncating the stored reply to keep the session cookie small
         conversation_entry = {
             'user_message': message,
-            'bot_response': response_data['response'],
-            'confidence': response_data['confidence'],
-            'timestamp': str(len(session['conversation_memory']))
+            'bot_response': response_data['response'][:MEMORY_RESPONSE_CHARS],
+            'confidence': response_data['confidence']
         }
         
         # Keep only last 5 exchanges to prevent session bloat
-        session['conversation_memory'].append(conversation_entry)
-        if len(session['conversation_memory']) > 5:
-            session['conversation_memory'] = session['conversation_memory'][-5:]
+        memory = deque(conversation_memory, maxlen=MEMORY_SIZE)
+        memory.append(conversation_entry)
         
-        # Mark session as modified for Flask to save it
-        session.modified = True
+        # Reassigning marks the session as modified for Flask to save it
+        session['conversation_memory'] = list(memory)
         
         logging.debug(f"Response data: {response_data}")
         logging.debug(f"Updated conversation memory: {len(session['conversation_memory'])} entries")
         
+        if response_stream is not None:
+            return _stream_chat_response(response_stream, response_data['confidence'])
+        
         return jsonify(response_data)
         
     except Exception as e:
@@ -79,6 +144,15 @@ def chat():
             'confidence': '0.00'
         }), 500
 
+def _stream_chat_response(response_stream, confidence):
+    """Relay streamed response text to the browser as server-sent events"""
+    def generate():
+        for text in response_stream:
+            yield f"data: {json.dumps({'text': text}, ensure_ascii=False)}\n\n"
+        yield f"event: done\ndata: {json.dumps({'confidence': confidence})}\n\n"
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream')
+
 @app.route('/admin/login', methods=['GET', 'POST'])
 def admin_login():
     """Admin login page"""
@@ -126,6 +200,7 @@ def add_qa_pair():
     if question and answer:
         success = data_manager.add_qa_pair(question, answer)
         if success:
+            _clear_response_cache()
             flash('Q&A pair added successfully!', 'success')
         else:
             flash('Failed to add Q&A pair.', 'danger')
@@ -146,6 +221,7 @@ def edit_qa_pair(qa_id):
     if question and answer:
         success = data_manager.update_qa_pair(qa_id, question, answer)
         if success:
+            _clear_response_cache()
             flash('Q&A pair updated successfully!', 'success')
         else:
             flash('Failed to update Q&A pair.', 'danger')
@@ -162,6 +238,7 @@ def delete_qa_pair(qa_id):
     
     success = data_manager.delete_qa_pair(qa_id)
     if success:
+        _clear_response_cache()
         flash('Q&A pair deleted successfully!', 'success')
     else:
         flash('Failed to delete Q&A pair.', 'danger')
@@ -180,4 +257,5 @@ def internal_error(error):
     return render_template('chatbot.html'), 500
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    port = int(os.environ.get("PORT", 5000))  # Railway assigns port via $PORT
+    app.run(host='0.0.0.0', port=port, debug=False)
@@ -1,18 +1,87 @@
 import json
 import os
 import logging
-from typing import List, Dict, Any, Optional, Tuple
+import functools
+import glob
+import hashlib
+import hmac
+import secrets
+import shutil
+import string
+import threading
+from typing import List, Dict, Any, Optional, Tuple, NamedTuple
 from werkzeug.security import generate_password_hash, check_password_hash
+import joblib
+import sklearn
+import sklearn.base
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
+import scipy.sparse
 import re
 
+try:
+    import orjson
+except ImportError:  # fall back to the standard library json module
+    orjson = None
+
+# Query category patterns, one alternation each
+_GREETING_PATTERN = r'\b(?:hi|hello|hey|salam|assalam|assalamualaikum|good\s+(?:morning|afternoon|evening))\b'
+_FAREWELL_PATTERN = r'\b(?:bye|goodbye|see\s+you|thanks|thank\s+you|khuda\s+hafiz)\b'
+_SMALL_TALK_PATTERN = r'\b(?:how\s+are\s+you|what\'s\s+up|how\s+is\s+it\s+going|what\s+can\s+you\s+do|what\s+do\s+you\s+know)\b'
+
+_GREETING_RE = re.compile(_GREETING_PATTERN)
+# All categories in one pattern; the name of the matching group tells which category was hit
+_CHIT_CHAT_RE = re.compile(
+    f'(?P<greeting>{_GREETING_PATTERN})|(?P<farewell>{_FAREWELL_PATTERN})|(?P<small_talk>{_SMALL_TALK_PATTERN})'
+)
+
+# Maps punctuation (other than the word character '_') to spaces in a single translate call
+_PUNCTUATION_TABLE = str.maketrans({char: ' ' for char in string.punctuation if char != '_'})
+_QUESTION_WORDS = frozenset({'what', 'who', 'when', 'where', 'why', 'how', 'which'})
+
+# Number of distinct query vectors kept in memory
+QUERY_CACHE_SIZE = 4096
+
+# Farewells and small talk are short; longer queries skip those scans
+CHIT_CHAT_MAX_LENGTH = 64
+
+class _SearchState(NamedTuple):
+    """Everything a search reads, replaced as a whole so readers never see a half-applied update"""
+    vectorizer: TfidfVectorizer
+    qa_pairs: List[Dict[str, Any]]
+    questions: List[str]
+    answers: List[str]
+    stacked_vectors: Any  # question rows followed by answer rows, so one product scores both
+    term_vectors: Any  # term-major copy: a query only reads the rows of the terms it contains
+    n_questions: int
+    stamp: Optional[Tuple[int, int]]  # stamp of the Q&A file the state was built from
+
 class DataManager:
     def __init__(self, data_dir: str = 'data'):
         self.data_dir = data_dir
         self.qa_file = os.path.join(data_dir, 'qa_data.json')
         self.admin_file = os.path.join(data_dir, 'admin_credentials.json')
+        # Fitted vectorizer and search matrix for the current Q&A data, reused across restarts;
+        # the file name carries the content hash, so a mismatch is seen without loading it
+        self.search_cache_pattern = os.path.join(data_dir, 'search_cache-{}.joblib')
+        
+        # Serializes Q&A file access and search data rebuilds between request threads;
+        # searches read the published state without taking it
+        self._lock = threading.RLock()
+        self._search_state: Optional[_SearchState] = None
+        
+        # In-memory copy of the Q&A file, valid while its (mtime, size) stamp is unchanged
+        self._qa_cache: Optional[Dict[str, Any]] = None
+        self._qa_cache_stamp: Optional[Tuple[int, int]] = None
+        
+        # Position of each pair ID in the cached pairs, and the highest ID in use
+        self._id_index: Dict[int, int] = {}
+        self._max_id = 0
+        
+        # Keyed digest of the last successful admin login, so repeat logins skip the slow
+        # password hash check. The key lives only in this process; no plaintext is kept.
+        self._login_key = secrets.token_bytes(32)
+        self._verified_login: Optional[bytes] = None
         
         # Create data directory if it doesn't exist
         os.makedirs(data_dir, exist_ok=True)
@@ -20,14 +89,19 @@ class DataManager:
         # Initialize files if they don't exist
         self._initialize_files()
         
-        # Initialize TF-IDF vectorizer
+        # TF-IDF vectorizer settings; each fit works on a fresh clone
         self.vectorizer = TfidfVectorizer(
             stop_words='english',
             ngram_range=(1, 2),
             max_features=1000,
-            lowercase=True
+            lowercase=True,
+            norm='l2',  # unit-length rows let search use a plain dot product as cosine similarity
+            dtype=np.float32  # halves memory traffic in similarity scoring
         )
         
+        # Memoize query vectors; repeated questions skip re-tokenization
+        self._transform_query = functools.lru_cache(maxsize=QUERY_CACHE_SIZE)(self._transform_query)
+        
         # Load and prepare data for similarity search
         self._prepare_search_data()
     
@@ -61,30 +135,88 @@ class DataManager:
             self._save_admin_credentials(default_admin)
     
     def _save_qa_data(self, data: Dict[str, Any]):
-        """Save Q&A data to file"""
+        """Save Q&A data to file, replacing it atomically so readers never see a partial write"""
+        # Callers hold self._lock, so a per-process temp file name can't collide
+        tmp_file = f"{self.qa_file}.{os.getpid()}.tmp"
         try:
-            with open(self.qa_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
+            if orjson is not None:
+                content = orjson.dumps(data, option=orjson.OPT_INDENT_2)
+            else:
+                content = json.dumps(data, indent=2, ensure_ascii=False).encode('utf-8')
+            
+            with open(tmp_file, 'wb') as f:
+                f.write(content)
+                f.flush()
+                os.fsync(f.fileno())
+            # Keep any permissions set on the existing file
+            if os.path.exists(self.qa_file):
+                shutil.copymode(self.qa_file, tmp_file)
+            os.replace(tmp_file, self.qa_file)
+            
+            self._qa_cache = self._copy_qa_data(data)
+            self._qa_cache_stamp = self._file_stamp(self.qa_file)
+            self._index_qa_ids()
         except Exception as e:
             logging.error(f"Error saving Q&A data: {str(e)}")
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
     
     def _save_admin_credentials(self, data: Dict[str, Any]):
         """Save admin credentials to file"""
         try:
             with open(self.admin_file, 'w', encoding='utf-8') as f:
                 json.dump(data, f, indent=2)
+            self._verified_login = None
         except Exception as e:
             logging.error(f"Error saving admin credentials: {str(e)}")
     
     def _load_qa_data(self) -> Dict[str, Any]:
-        """Load Q&A data from file"""
+        """
+        Load Q&A data from file, reusing the in-memory copy while the file is unchanged
+        Callers hold self._lock so the returned data matches self._qa_cache_stamp
+        """
         try:
-            with open(self.qa_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            stamp = self._file_stamp(self.qa_file)
+            if self._qa_cache is None or stamp != self._qa_cache_stamp:
+                if orjson is not None:
+                    with open(self.qa_file, 'rb') as f:
+                        self._qa_cache = orjson.loads(f.read())
+                else:
+                    with open(self.qa_file, 'r', encoding='utf-8') as f:
+                        self._qa_cache = json.load(f)
+                self._qa_cache_stamp = stamp
+                self._index_qa_ids()
+            
+            # Callers modify the returned pairs in place, so hand out a copy
+            return self._copy_qa_data(self._qa_cache)
         except Exception as e:
             logging.error(f"Error loading Q&A data: {str(e)}")
             return {"qa_pairs": [], "embeddings": []}
     
+    def _index_qa_ids(self):
+        """Rebuild the ID lookup for the cached Q&A pairs"""
+        qa_pairs = self._qa_cache.get('qa_pairs', [])
+        self._id_index = {pair.get('id', 0): index for index, pair in enumerate(qa_pairs)}
+        self._max_id = max(self._id_index, default=0)
+    
+    def _find_qa_index(self, qa_pairs: List[Dict[str, Any]], qa_id: int) -> Optional[int]:
+        """Return the position of a pair ID in freshly loaded Q&A pairs, or None"""
+        index = self._id_index.get(qa_id)
+        if index is not None and index < len(qa_pairs) and qa_pairs[index].get('id') == qa_id:
+            return index
+        return None
+    
+    @staticmethod
+    def _copy_qa_data(data: Dict[str, Any]) -> Dict[str, Any]:
+        """Copy Q&A data deep enough that changes to pairs don't leak into the cache"""
+        return {**data, 'qa_pairs': [dict(pair) for pair in data.get('qa_pairs', [])]}
+    
+    @staticmethod
+    def _file_stamp(path: str) -> Tuple[int, int]:
+        """Return a (mtime, size) stamp used to detect changes to a file"""
+        file_stat = os.stat(path)
+        return file_stat.st_mtime_ns, file_stat.st_size
+    
     def _load_admin_credentials(self) -> Dict[str, Any]:
         """Load admin credentials from file"""
         try:
@@ -96,154 +228,278 @@ class DataManager:
     
     def _prepare_search_data(self):
         """Prepare data for similarity search"""
-        qa_data = self._load_qa_data()
-        qa_pairs = qa_data.get('qa_pairs', [])
+        with self._lock:
+            qa_data = self._load_qa_data()
+            qa_pairs = qa_data.get('qa_pairs', [])
+            stamp = self._qa_cache_stamp
+            
+            if not qa_pairs:
+                self._search_state = None
+                self._fitted_size = 0
+                self._transform_query.cache_clear()
+                return
+            
+            # Extract questions, answers and combined text for better matching in one pass
+            questions = []
+            answers = []
+            combined_texts = []
+            for pair in qa_pairs:
+                question, answer = pair['question'], pair['answer']
+                questions.append(question)
+                answers.append(answer)
+                combined_texts.append(f"{question} {answer}")
+            
+            try:
+                cache_key = self._search_cache_key(questions, answers)
+                cached = self._load_search_cache(cache_key)
+                if cached is not None:
+                    vectorizer, stacked_vectors = cached
+                else:
+                    # Fit a fresh vectorizer on combined texts, leaving the published one untouched
+                    # for searches running meanwhile, then transform questions and answers in one call
+                    vectorizer = sklearn.base.clone(self.vectorizer)
+                    vectorizer.fit(combined_texts)
+                    stacked_vectors = vectorizer.transform(questions + answers)
+                    self._save_search_cache(cache_key, vectorizer, stacked_vectors)
+                
+                self._publish_search_state(vectorizer, qa_pairs, questions, answers, stacked_vectors, stamp)
+                self._fitted_size = len(qa_pairs)
+                logging.debug(f"Prepared search data for {len(qa_pairs)} Q&A pairs")
+            except Exception as e:
+                logging.error(f"Error preparing search data: {str(e)}")
+                self._search_state = None
+                self._fitted_size = 0
+            
+            # Cached query vectors belong to the old vectorizer and can be dropped
+            self._transform_query.cache_clear()
+    
+    def _search_cache_key(self, questions: List[str], answers: List[str]) -> str:
+        """Hash everything the fitted search data depends on"""
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f"{sklearn.__version__}\0{sorted(self.vectorizer.get_params().items())}".encode('utf-8'))
+        for text in questions + answers:
+            digest.update(b'\0')
+            digest.update(text.encode('utf-8'))
+        return digest.hexdigest()
+    
+    def _load_search_cache(self, cache_key: str) -> Optional[Tuple[TfidfVectorizer, Any]]:
+        """Return the cached (vectorizer, stacked vectors) if the cache matches the Q&A data"""
+        cache_file = self.search_cache_pattern.format(cache_key)
+        if not os.path.exists(cache_file):
+            return None
+        try:
+            cached = joblib.load(cache_file)
+            logging.debug("Loaded search data from cache")
+            return cached['vectorizer'], cached['vectors']
+        except Exception as e:
+            logging.error(f"Error loading search cache: {str(e)}")
+            return None
+    
+    def _save_search_cache(self, cache_key: str, vectorizer: TfidfVectorizer, stacked_vectors):
+        """Persist the fitted vectorizer and search matrix, removing caches for older data"""
+        cache_file = self.search_cache_pattern.format(cache_key)
+        tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+        try:
+            joblib.dump(
+                {'vectorizer': vectorizer, 'vectors': stacked_vectors},
+                tmp_file,
+                compress=3
+            )
+            os.replace(tmp_file, cache_file)
+            
+            for stale_file in glob.glob(self.search_cache_pattern.format('*')):
+                if stale_file != cache_file:
+                    os.remove(stale_file)
+        except Exception as e:
+            logging.error(f"Error saving search cache: {str(e)}")
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+    
+    def _publish_search_state(self, vectorizer: TfidfVectorizer, qa_pairs: List[Dict[str, Any]],
+                              questions: List[str], answers: List[str], stacked_vectors,
+                              stamp: Optional[Tuple[int, int]]):
+        """Build a new search state and swap it in with a single assignment"""
+        stacked_vectors = stacked_vectors.tocsr()
+        self._search_state = _SearchState(
+            vectorizer=vectorizer,
+            qa_pairs=qa_pairs,
+            questions=questions,
+            answers=answers,
+            stacked_vectors=stacked_vectors,
+            term_vectors=stacked_vectors.T.tocsr(),
+            n_questions=len(questions),
+            stamp=stamp
+        )
+    
+    def _needs_refit(self, loaded_stamp: Optional[Tuple[int, int]], new_count: int, texts: List[str]) -> bool:
+        """
+        Check whether a change to the Q&A pairs needs a full vectorizer refit
+        instead of updating only the affected rows
+        loaded_stamp is the stamp of the file the change was applied to
+        """
+        state = self._search_state
         
-        if not qa_pairs:
-            self.questions = []
-            self.answers = []
-            self.qa_pairs = []
-            self.question_vectors = None
-            self.answer_vectors = None
-            return
+        # Search data is missing or was built from a different version of the file,
+        # e.g. one since changed by another worker, so its rows may not line up
+        if state is None or loaded_stamp != state.stamp:
+            return True
         
-        # Extract questions and answers
-        self.questions = [pair['question'] for pair in qa_pairs]
-        self.answers = [pair['answer'] for pair in qa_pairs]
-        self.qa_pairs = qa_pairs
+        # Refit once the corpus has doubled or halved since the last fit
+        if new_count >= 2 * self._fitted_size or new_count <= self._fitted_size // 2:
+            return True
         
-        # Create combined text for better matching (questions + answers)
-        combined_texts = [f"{pair['question']} {pair['answer']}" for pair in qa_pairs]
+        # New terms only become searchable through a refit while the vocabulary has room
+        vocabulary = state.vectorizer.vocabulary_
+        if len(vocabulary) < state.vectorizer.max_features:
+            analyzer = state.vectorizer.build_analyzer()
+            return any(term not in vocabulary for text in texts for term in analyzer(text))
         
-        try:
-            # Fit vectorizer on combined texts and transform questions and answers separately
-            self.vectorizer.fit(combined_texts)
-            self.question_vectors = self.vectorizer.transform(self.questions)
-            self.answer_vectors = self.vectorizer.transform(self.answers)
-            logging.debug(f"Prepared search data for {len(qa_pairs)} Q&A pairs")
-        except Exception as e:
-            logging.error(f"Error preparing search data: {str(e)}")
-            self.question_vectors = None
-            self.answer_vectors = None
+        return False
     
-    def search_qa(self, query: str, min_confidence: float = 0.1) -> Tuple[Optional[str], float, str]:
+    def _transform_query(self, vectorizer: TfidfVectorizer, query_lower: str):
+        """Vectorize a lowercased query; the vectorizer is part of the cache key"""
+        return vectorizer.transform([query_lower])
+    
+    def search_qa(self, query: str, min_confidence: float = 0.1,
+                  query_lower: Optional[str] = None) -> Tuple[Optional[str], float, str]:
         """
         Enhanced search that looks in both questions and answers
+        Pass query_lower if the lowercased query is already at hand
         Returns: (answer, confidence, search_type)
         search_type can be 'question_match', 'reverse_lookup', or 'no_match'
         """
-        if not self.qa_pairs or self.question_vectors is None:
+        # Read the published state once; admin changes replace it rather than modify it
+        state = self._search_state
+        if state is None:
             return None, 0.0, 'no_match'
         
         try:
-            # Transform query
-            query_vector = self.vectorizer.transform([query.lower()])
+            # Transform query; punctuation and whitespace are collapsed so variants share
+            # a cache entry, which the tokenizer ignores anyway
+            if query_lower is None:
+                query_lower = query.lower()
+            query_vector = self._transform_query(
+                state.vectorizer, ' '.join(query_lower.translate(_PUNCTUATION_TABLE).split())
+            )
+            
+            # TF-IDF rows are L2-normalized, so a plain dot product is the cosine similarity
+            similarities = (query_vector @ state.term_vectors).toarray().ravel()
             
-            # Search in questions (normal Q&A)
-            question_similarities = cosine_similarity(query_vector, self.question_vectors)[0]
-            max_q_idx = np.argmax(question_similarities)
-            max_q_similarity = question_similarities[max_q_idx]
+            # Best match across questions and answers; ties go to the question row
+            best_idx = int(similarities.argmax())
+            best_similarity = similarities[best_idx]
             
-            # Search in answers (reverse lookup)
-            answer_similarities = cosine_similarity(query_vector, self.answer_vectors)[0]
-            max_a_idx = np.argmax(answer_similarities)
-            max_a_similarity = answer_similarities[max_a_idx]
+            if best_similarity < min_confidence:
+                return None, best_similarity, 'no_match'
             
-            # Determine best match
-            if max_q_similarity >= max_a_similarity and max_q_similarity >= min_confidence:
+            if best_idx < state.n_questions:
                 # Normal question match
                 return (
-                    self.qa_pairs[max_q_idx]['answer'],
-                    max_q_similarity,
+                    state.qa_pairs[best_idx]['answer'],
+                    best_similarity,
                     'question_match'
                 )
-            elif max_a_similarity >= min_confidence:
-                # Reverse lookup - found entity/person in answer, return the question context
-                answer_text = self.qa_pairs[max_a_idx]['answer']
-                question_text = self.qa_pairs[max_a_idx]['question']
-                
-                # Create contextual response for reverse lookup
-                # Example: "Who is Talat Wazir?" -> "Talat Wazir is the principal of APS Mangla"
-                return (
-                    answer_text,
-                    max_a_similarity,
-                    'reverse_lookup'
-                )
             
-            return None, max(max_q_similarity, max_a_similarity), 'no_match'
+            # Reverse lookup - found entity/person in answer, return that answer
+            # Example: "Who is Talat Wazir?" -> "Talat Wazir is the principal of APS Mangla"
+            return (
+                state.qa_pairs[best_idx - state.n_questions]['answer'],
+                best_similarity,
+                'reverse_lookup'
+            )
             
         except Exception as e:
             logging.error(f"Error in search_qa: {str(e)}")
             return None, 0.0, 'no_match'
     
-    def get_contextual_search_results(self, query: str) -> Dict[str, Any]:
+    def classify_query(self, query: str) -> Dict[str, Any]:
         """
-        Get detailed search results with context for intelligent response generation
+        Classify a query as a question, greeting, farewell or small talk
+        without running the similarity search
         """
-        answer, confidence, search_type = self.search_qa(query)
-        
-        # Analyze query for better context
         query_lower = query.lower().strip()
         
         # Detect question type
-        question_words = ['what', 'who', 'when', 'where', 'why', 'how', 'which']
-        is_question = any(word in query_lower for word in question_words) or query.endswith('?')
+        is_question = query.endswith('?') or not _QUESTION_WORDS.isdisjoint(query_lower.translate(_PUNCTUATION_TABLE).split())
         
-        # Detect greeting patterns
-        greeting_patterns = [
-            r'\b(hi|hello|hey|salam|assalam|assalamualaikum)\b',
-            r'\b(good\s+(morning|afternoon|evening))\b',
-        ]
-        is_greeting = any(re.search(pattern, query_lower) for pattern in greeting_patterns)
+        # Detect greetings, farewells and small talk in one scan; long queries are only
+        # checked for greetings
+        if len(query_lower) < CHIT_CHAT_MAX_LENGTH:
+            categories = {match.lastgroup for match in _CHIT_CHAT_RE.finditer(query_lower)}
+        else:
+            categories = {'greeting'} if _GREETING_RE.search(query_lower) else set()
         
-        # Detect farewell patterns
-        farewell_patterns = [
-            r'\b(bye|goodbye|see\s+you|thanks|thank\s+you|khuda\s+hafiz)\b',
-        ]
-        is_farewell = any(re.search(pattern, query_lower) for pattern in farewell_patterns)
+        # Greetings are handled first, then farewells, then small talk
+        is_greeting = 'greeting' in categories
+        is_farewell = not is_greeting and 'farewell' in categories
+        is_small_talk = not is_greeting and not is_farewell and 'small_talk' in categories
+        
+        return {
+            'is_question': is_question,
+            'is_greeting': is_greeting,
+            'is_farewell': is_farewell,
+            'is_small_talk': is_small_talk,
+            'original_query': query,
+            'processed_query': query_lower
+        }
+    
+    def get_contextual_search_results(self, query: str, query_analysis: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Get detailed search results with context for intelligent response generation
+        Pass query_analysis from classify_query to avoid classifying the query twice
+        """
+        # Analyze query for better context
+        if query_analysis is None:
+            query_analysis = self.classify_query(query)
         
-        # Detect small talk patterns
-        small_talk_patterns = [
-            r'\b(how\s+are\s+you|what\'s\s+up|how\s+is\s+it\s+going)\b',
-            r'\b(what\s+can\s+you\s+do|what\s+do\s+you\s+know)\b',
-        ]
-        is_small_talk = any(re.search(pattern, query_lower) for pattern in small_talk_patterns)
+        answer, confidence, search_type = self.search_qa(query, query_lower=query_analysis['processed_query'])
         
         return {
             'answer': answer,
             'confidence': confidence,
             'search_type': search_type,
-            'query_analysis': {
-                'is_question': is_question,
-                'is_greeting': is_greeting,
-                'is_farewell': is_farewell,
-                'is_small_talk': is_small_talk,
-                'original_query': query,
-                'processed_query': query_lower
-            }
+            'query_analysis': query_analysis
         }
     
     def add_qa_pair(self, question: str, answer: str) -> bool:
         """Add new Q&A pair"""
         try:
-            qa_data = self._load_qa_data()
-            qa_pairs = qa_data.get('qa_pairs', [])
-            
-            # Generate new ID
-            new_id = max([pair.get('id', 0) for pair in qa_pairs], default=0) + 1
-            
-            # Add new pair
-            qa_pairs.append({
-                'id': new_id,
-                'question': question,
-                'answer': answer
-            })
-            
-            qa_data['qa_pairs'] = qa_pairs
-            self._save_qa_data(qa_data)
-            
-            # Refresh search data
-            self._prepare_search_data()
+            with self._lock:
+                qa_data = self._load_qa_data()
+                qa_pairs = qa_data.get('qa_pairs', [])
+                loaded_stamp = self._qa_cache_stamp
+                
+                # Generate new ID
+                new_id = self._max_id + 1
+                
+                # Add new pair
+                qa_pairs.append({
+                    'id': new_id,
+                    'question': question,
+                    'answer': answer
+                })
+                
+                qa_data['qa_pairs'] = qa_pairs
+                self._save_qa_data(qa_data)
+                
+                # Refresh search data, vectorizing only the new pair when possible
+                if self._needs_refit(loaded_stamp, len(qa_pairs), [question, answer]):
+                    self._prepare_search_data()
+                else:
+                    state = self._search_state
+                    new_vectors = state.vectorizer.transform([question, answer])
+                    n = state.n_questions
+                    self._publish_search_state(
+                        state.vectorizer,
+                        qa_pairs,
+                        state.questions + [question],
+                        state.answers + [answer],
+                        scipy.sparse.vstack([
+                            state.stacked_vectors[:n], new_vectors[0],
+                            state.stacked_vectors[n:], new_vectors[1]
+                        ]),
+                        self._qa_cache_stamp
+                    )
             
             logging.info(f"Added new Q&A pair with ID {new_id}")
             return True
@@ -255,20 +511,36 @@ class DataManager:
     def update_qa_pair(self, qa_id: int, question: str, answer: str) -> bool:
         """Update existing Q&A pair"""
         try:
-            qa_data = self._load_qa_data()
-            qa_pairs = qa_data.get('qa_pairs', [])
-            
-            # Find and update the pair
-            for pair in qa_pairs:
-                if pair.get('id') == qa_id:
+            with self._lock:
+                qa_data = self._load_qa_data()
+                qa_pairs = qa_data.get('qa_pairs', [])
+                loaded_stamp = self._qa_cache_stamp
+                
+                # Find and update the pair
+                index = self._find_qa_index(qa_pairs, qa_id)
+                if index is not None:
+                    pair = qa_pairs[index]
                     pair['question'] = question
                     pair['answer'] = answer
                     
                     qa_data['qa_pairs'] = qa_pairs
                     self._save_qa_data(qa_data)
                     
-                    # Refresh search data
-                    self._prepare_search_data()
+                    # Refresh search data, re-vectorizing only the edited pair when possible
+                    if self._needs_refit(loaded_stamp, len(qa_pairs), [question, answer]):
+                        self._prepare_search_data()
+                    else:
+                        state = self._search_state
+                        new_vectors = state.vectorizer.transform([question, answer])
+                        questions = list(state.questions)
+                        answers = list(state.answers)
+                        questions[index] = question
+                        answers[index] = answer
+                        stacked = self._replace_row(state.stacked_vectors, index, new_vectors[0])
+                        stacked = self._replace_row(stacked, state.n_questions + index, new_vectors[1])
+                        self._publish_search_state(
+                            state.vectorizer, qa_pairs, questions, answers, stacked, self._qa_cache_stamp
+                        )
                     
                     logging.info(f"Updated Q&A pair with ID {qa_id}")
                     return True
@@ -283,22 +555,35 @@ class DataManager:
     def delete_qa_pair(self, qa_id: int) -> bool:
         """Delete Q&A pair"""
         try:
-            qa_data = self._load_qa_data()
-            qa_pairs = qa_data.get('qa_pairs', [])
-            
-            # Filter out the pair to delete
-            original_count = len(qa_pairs)
-            qa_pairs = [pair for pair in qa_pairs if pair.get('id') != qa_id]
-            
-            if len(qa_pairs) < original_count:
-                qa_data['qa_pairs'] = qa_pairs
-                self._save_qa_data(qa_data)
+            with self._lock:
+                qa_data = self._load_qa_data()
+                qa_pairs = qa_data.get('qa_pairs', [])
+                loaded_stamp = self._qa_cache_stamp
                 
-                # Refresh search data
-                self._prepare_search_data()
+                # Find the pair to delete
+                index = self._find_qa_index(qa_pairs, qa_id)
                 
-                logging.info(f"Deleted Q&A pair with ID {qa_id}")
-                return True
+                if index is not None:
+                    del qa_pairs[index]
+                    qa_data['qa_pairs'] = qa_pairs
+                    self._save_qa_data(qa_data)
+                    
+                    # Refresh search data, dropping only the deleted rows when possible
+                    if self._needs_refit(loaded_stamp, len(qa_pairs), []):
+                        self._prepare_search_data()
+                    else:
+                        state = self._search_state
+                        self._publish_search_state(
+                            state.vectorizer,
+                            qa_pairs,
+                            state.questions[:index] + state.questions[index + 1:],
+                            state.answers[:index] + state.answers[index + 1:],
+                            self._delete_rows(state.stacked_vectors, [index, state.n_questions + index]),
+                            self._qa_cache_stamp
+                        )
+                    
+                    logging.info(f"Deleted Q&A pair with ID {qa_id}")
+                    return True
             
             logging.warning(f"Q&A pair with ID {qa_id} not found")
             return False
@@ -307,9 +592,22 @@ class DataManager:
             logging.error(f"Error deleting Q&A pair: {str(e)}")
             return False
     
+    @staticmethod
+    def _replace_row(matrix, index: int, row):
+        """Return a copy of a CSR matrix with one row replaced"""
+        return scipy.sparse.vstack([matrix[:index], row, matrix[index + 1:]]).tocsr()
+    
+    @staticmethod
+    def _delete_rows(matrix, indices: List[int]):
+        """Return a copy of a CSR matrix without the given rows"""
+        keep = np.ones(matrix.shape[0], dtype=bool)
+        keep[indices] = False
+        return matrix[keep]
+    
     def get_all_qa_pairs(self) -> List[Dict[str, Any]]:
         """Get all Q&A pairs"""
-        qa_data = self._load_qa_data()
+        with self._lock:
+            qa_data = self._load_qa_data()
         return qa_data.get('qa_pairs', [])
     
     def verify_admin_credentials(self, username: str, password: str) -> bool:
@@ -322,8 +620,24 @@ class DataManager:
             if not stored_username or not stored_hash:
                 return False
             
-            return username == stored_username and check_password_hash(stored_hash, password)
+            if username != stored_username:
+                return False
+            
+            digest = self._login_digest(stored_hash, username, password)
+            if self._verified_login is not None and hmac.compare_digest(self._verified_login, digest):
+                return True
+            
+            if not check_password_hash(stored_hash, password):
+                return False
+            
+            self._verified_login = digest
+            return True
             
         except Exception as e:
             logging.error(f"Error verifying credentials: {str(e)}")
             return False
+    
+    def _login_digest(self, stored_hash: str, username: str, password: str) -> bytes:
+        """Keyed digest of a login attempt, bound to the currently stored password hash"""
+        message = '\0'.join((stored_hash, username, password)).encode('utf-8')
+        return hmac.new(self._login_key, message, hashlib.sha256).digest()
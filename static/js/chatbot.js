@@ -113,16 +113,27 @@ document.addEventListener('DOMContentLoaded', function() {
         
         fetch('/chat', {
             method: 'POST',
+            headers: {
+                'Accept': 'text/event-stream, application/json'
+            },
             body: formData
         })
         .then(response => {
             console.log('Response status:', response.status);
+            
+            // AI-enhanced answers are streamed as server-sent events
+            const contentType = response.headers.get('Content-Type') || '';
+            if (contentType.includes('text/event-stream')) {
+                return readStreamedResponse(response).then(() => null);
+            }
             return response.json();
         })
         .then(data => {
             console.log('Response data:', data);
             
-            if (data.error) {
+            if (!data) {
+                updateStatus('success', 'Response received');
+            } else if (data.error) {
                 addMessage(`Sorry, there was an error: ${data.error}`, 'bot');
                 updateStatus('error', 'Error occurred');
             } else {
@@ -142,6 +153,59 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
     
+    function readStreamedResponse(response) {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let text = '';
+        let streamingMessage = null;
+        
+        function handleEvent(rawEvent) {
+            let eventType = 'message';
+            let data = '';
+            rawEvent.split('\n').forEach(line => {
+                if (line.startsWith('event:')) {
+                    eventType = line.slice(6).trim();
+                } else if (line.startsWith('data:')) {
+                    data += line.slice(5).trim();
+                }
+            });
+            if (!data) return;
+            
+            const payload = JSON.parse(data);
+            if (eventType === 'done') {
+                // Re-render the finished message with its confidence badge
+                if (streamingMessage) {
+                    streamingMessage.remove();
+                }
+                addMessage(text, 'bot', payload.confidence);
+                return;
+            }
+            
+            text += payload.text;
+            if (!streamingMessage) {
+                addMessage(text, 'bot');
+                streamingMessage = chatContainer.lastElementChild;
+            } else {
+                streamingMessage.querySelector('.message-content').innerHTML = `<i class="fas fa-robot me-2"></i>${text}`;
+                scrollToBottom();
+            }
+        }
+        
+        function pump() {
+            return reader.read().then(({ done, value }) => {
+                if (done) return;
+                buffer += decoder.decode(value, { stream: true });
+                const events = buffer.split('\n\n');
+                buffer = events.pop();
+                events.forEach(handleEvent);
+                return pump();
+            });
+        }
+        
+        return pump();
+    }
+    
     function setFormState(enabled) {
         messageInput.disabled = !enabled;
         sendBtn.disabled = !enabled;